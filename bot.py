@@ -8,7 +8,8 @@ import asyncio
 import re
 
 #plan imports
-from portia_client import portia, bug_report_plan, feature_request_plan, doc_search_plan, prioritization_plan, triage_plan, weekly_digest_plan
+from plan_jobs import error_messages, log_plan_error, run_plan_job
+from job_queue import JobQueue
 
 #email checking regex
 EMAIL_REGEX = re.compile(r"^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$")
@@ -18,6 +19,14 @@ print("Starting AI Product Manager Bot...")
 load_dotenv()
 token = os.getenv("DISCORD_TOKEN")
 
+#with PLAN_QUEUE_DB set the bot only runs the gateway and enqueues plan jobs
+#for worker.py; otherwise plans run in this process's thread pool
+PLAN_QUEUE_DB = os.getenv("PLAN_QUEUE_DB")
+plan_queue = JobQueue(PLAN_QUEUE_DB) if PLAN_QUEUE_DB else None
+if plan_queue is None:
+    #build the Portia client at startup so inline mode fails fast on bad config
+    import portia_client
+
 
 #intents, perms, handler and command init
 handler = logging.FileHandler(filename='discord.log', encoding='utf-8', mode='w')
@@ -46,6 +55,27 @@ async def on_member_join(member):
         await channel.send(f"Welcome, {member.mention}! Type /help to see what I can do.")
 
 
+async def dispatch_plan(interaction: discord.Interaction, kind: str, inputs: dict | None = None, context: dict | None = None):
+    try:
+        if plan_queue is not None:
+            payload = {
+                "application_id": interaction.application_id,
+                "token": interaction.token,
+                "inputs": inputs,
+                "context": context or {},
+            }
+            await asyncio.to_thread(plan_queue.enqueue, kind, payload)
+            return
+
+        messages = await asyncio.to_thread(run_plan_job, kind, inputs, context or {})
+        for message in messages:
+            await interaction.followup.send(**message)
+    except Exception as e:
+        log_plan_error(kind, e)
+        for message in error_messages(kind):
+            await interaction.followup.send(**message)
+
+
 
 
 @bot.tree.command(name="bug-report", description="Report a bug to be triaged automatically.")
@@ -61,26 +91,12 @@ async def bug_report(interaction: discord.Interaction, description: str, email:
         return
 
     logging.info(f"Bug report received from {interaction.user}: {description}")
-    try:
-        plan_run = await asyncio.to_thread(
-            lambda: portia.run_plan(
-                bug_report_plan,
-                plan_run_inputs={"bug_description": description, "user_email": email}
-            )
-        )
-        final_output = plan_run.outputs.final_output.value
-        embed = discord.Embed(
-            title="✅ Bug Report Processed Successfully",
-            description="Your report has been submitted and tickets have been created.",
-            color=discord.Color.green()
-        )
-        embed.add_field(name="GitHub Issue", value=f"[View Issue]({final_output.github_issue_url})", inline=True)
-        embed.add_field(name="Linear Ticket", value=f"[View Ticket]({final_output.linear_ticket_url})", inline=True)
-        embed.set_footer(text=f"A confirmation has been sent to {email}.")
-        await interaction.followup.send(embed=embed)
-    except Exception as e:
-        logging.error(f"Error running bug_report_plan: {e}")
-        await interaction.followup.send("❌ An error occurred while processing your bug report.", ephemeral=True)
+    await dispatch_plan(
+        interaction,
+        "bug_report",
+        inputs={"bug_description": description, "user_email": email},
+        context={"email": email},
+    )
 
 
 
@@ -98,26 +114,12 @@ async def feature_request(interaction: discord.Interaction, description: str, em
         return
 
     logging.info(f"Feature request received from {interaction.user}: {description}")
-    try:
-        plan_run = await asyncio.to_thread(
-            lambda: portia.run_plan(
-                feature_request_plan,
-                plan_run_inputs={"feature_description": description, "user_email": email}
-            )
-        )
-        final_output = plan_run.outputs.final_output.value
-        embed = discord.Embed(
-            title="💡 Feature Request Processed",
-            description="Your suggestion has been submitted and tickets have been created.",
-            color=discord.Color.blue()
-        )
-        embed.add_field(name="GitHub Issue", value=f"[View Issue]({final_output.github_issue_url})", inline=True)
-        embed.add_field(name="Linear Ticket", value=f"[View Ticket]({final_output.linear_ticket_url})", inline=True)
-        embed.set_footer(text=f"A confirmation has been sent to {email}.")
-        await interaction.followup.send(embed=embed)
-    except Exception as e:
-        logging.error(f"Error running feature_request_plan: {e}")
-        await interaction.followup.send("❌ An error occurred while processing your feature request.", ephemeral=True)
+    await dispatch_plan(
+        interaction,
+        "feature_request",
+        inputs={"feature_description": description, "user_email": email},
+        context={"email": email},
+    )
 
 
 
@@ -129,33 +131,12 @@ async def feature_request(interaction: discord.Interaction, description: str, em
 async def doc_search(interaction: discord.Interaction, query: str):
     await interaction.response.defer(thinking=True)
     logging.info(f"Doc search received from {interaction.user}: {query}")
-
-    try:
-        plan_run = await asyncio.to_thread(
-            lambda: portia.run_plan(
-                doc_search_plan,
-                plan_run_inputs={"user_query": query}
-            )
-        )
-        answer = plan_run.outputs.final_output.value.answer
-
-        embed = discord.Embed(
-            title=f"🔎 Search Results for:",
-            description=f"> {query}",
-            color=discord.Color.og_blurple()
-        )
-        embed.set_footer(text=f"Search performed for {interaction.user.display_name}")
-        await interaction.followup.send(embed=embed)
-        if answer:
-            for i in range(0, len(answer), 2000):
-                chunk = answer[i:i+2000]
-                await interaction.followup.send(chunk)
-        else:
-            await interaction.followup.send("No answer was found.")
-
-    except Exception as e:
-        logging.error(f"Error running doc_search_plan: {e}")
-        await interaction.followup.send("Sorry, I couldn't find an answer to that question.")
+    await dispatch_plan(
+        interaction,
+        "doc_search",
+        inputs={"user_query": query},
+        context={"query": query, "display_name": interaction.user.display_name},
+    )
 
 
 
@@ -163,24 +144,7 @@ async def doc_search(interaction: discord.Interaction, query: str):
 async def triage(interaction: discord.Interaction):
     await interaction.response.defer(thinking=True)
     logging.info(f"Triage command received from {interaction.user}")
-
-    try:
-        plan_run = await asyncio.to_thread(
-            lambda: portia.run_plan(triage_plan)
-        )
-
-        result_markdown = plan_run.outputs.final_output.value.triage_report
-        embed = discord.Embed(
-            title="📋 Triage Suggestions",
-            description=result_markdown if result_markdown else "No issues found requiring triage. Everything looks up to date!",
-            color=discord.Color.orange()
-        )
-        embed.set_footer(text="These are AI-generated suggestions for issues missing priorities or labels.")
-        await interaction.followup.send(embed=embed)
-
-    except Exception as e:
-        logging.error(f"Error running triage_plan: {e}")
-        await interaction.followup.send("Sorry, I was unable to analyze issues for triage.")
+    await dispatch_plan(interaction, "triage")
 
 
 
@@ -188,25 +152,7 @@ async def triage(interaction: discord.Interaction):
 async def priority(interaction: discord.Interaction):
     await interaction.response.defer(thinking=True)
     logging.info(f"Priority command received from {interaction.user}")
-
-    try:
-        plan_run = await asyncio.to_thread(
-            lambda: portia.run_plan(prioritization_plan)
-        )
-        
-        
-        result_markdown = plan_run.outputs.final_output.value.priority_list
-        embed = discord.Embed(
-            title="📈 Top Priority Issues",
-            description=result_markdown,
-            color=discord.Color.gold()
-        )
-        embed.set_footer(text="Analysis complete. These issues are recommended for immediate focus.")
-        await interaction.followup.send(embed=embed)
-
-    except Exception as e:
-        logging.error(f"Error running prioritization_plan: {e}")
-        await interaction.followup.send("Sorry, I was unable to analyze the issues.")
+    await dispatch_plan(interaction, "priority")
 
 
 
@@ -214,27 +160,7 @@ async def priority(interaction: discord.Interaction):
 async def digest(interaction: discord.Interaction):
     await interaction.response.defer(thinking=True)
     logging.info(f"Digest command received from {interaction.user}")
-
-    try:
-        plan_run = await asyncio.to_thread(
-            lambda: portia.run_plan(weekly_digest_plan)
-        )
-        result_markdown = plan_run.outputs.final_output.value.digest_report
-
-        embed = discord.Embed(
-            title="🗓️ Weekly Activity Digest",
-            description=result_markdown,
-            color=discord.Color.teal()
-        )
-        embed.set_footer(text="A summary of all activity in the last 7 days.")
-
-        await interaction.followup.send(embed=embed)
-
-    except Exception as e:
-        logging.error(f"Error running weekly_digest_plan: {e}")
-        await interaction.followup.send(
-            "Sorry, I was unable to generate the weekly digest."
-        )
+    await dispatch_plan(interaction, "digest")
 
 
 
@@ -0,0 +1,89 @@
+import json
+import logging
+import sqlite3
+import time
+from contextlib import closing
+
+#durable plan job queue shared by the gateway and the plan workers.
+#every call opens (and closes) its own connection so it is safe from
+#asyncio.to_thread and from separate worker processes; WAL keeps readers
+#off the writers' backs.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS plan_jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',
+    worker TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    claimed_at REAL
+);
+CREATE INDEX IF NOT EXISTS plan_jobs_status ON plan_jobs (status, id);
+"""
+
+
+class JobQueue:
+    def __init__(self, path: str):
+        #"" would give every connection its own private temporary database
+        if not path:
+            raise ValueError("JobQueue needs a database path")
+        self.path = path
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    def enqueue(self, kind: str, payload: dict) -> int:
+        with closing(self._connect()) as conn:
+            cursor = conn.execute(
+                "INSERT INTO plan_jobs (kind, payload, created_at) VALUES (?, ?, ?)",
+                (kind, json.dumps(payload), time.time()),
+            )
+            return cursor.lastrowid
+
+    def claim(self, worker: str):
+        """Atomically take the oldest queued job, or return None if the queue is empty.
+
+        Returns (id, kind, payload, created_at, attempts), where attempts counts this claim.
+        """
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                """
+                UPDATE plan_jobs SET status = 'running', worker = ?, claimed_at = ?, attempts = attempts + 1
+                WHERE id = (SELECT id FROM plan_jobs WHERE status = 'queued' ORDER BY id LIMIT 1)
+                RETURNING id, kind, payload, created_at, attempts
+                """,
+                (worker, time.time()),
+            ).fetchone()
+        if row is None:
+            return None
+        job_id, kind, payload, created_at, attempts = row
+        return job_id, kind, json.loads(payload), created_at, attempts
+
+    def complete(self, job_id: int):
+        with closing(self._connect()) as conn:
+            conn.execute("DELETE FROM plan_jobs WHERE id = ?", (job_id,))
+
+    def fail(self, job_id: int, error: str):
+        #failed rows are dropped rather than kept: the payload holds the
+        #interaction token and user inputs such as email addresses
+        logging.error(f"Plan job {job_id} failed: {error}")
+        self.complete(job_id)
+
+    def requeue_running(self, worker: str | None = None) -> int:
+        """Put jobs left 'running' by a dead worker (or by every worker) back in the queue."""
+        with closing(self._connect()) as conn:
+            if worker is None:
+                cursor = conn.execute(
+                    "UPDATE plan_jobs SET status = 'queued', worker = NULL, claimed_at = NULL WHERE status = 'running'"
+                )
+            else:
+                cursor = conn.execute(
+                    "UPDATE plan_jobs SET status = 'queued', worker = NULL, claimed_at = NULL WHERE status = 'running' AND worker = ?",
+                    (worker,),
+                )
+            return cursor.rowcount
@@ -0,0 +1,152 @@
+import logging
+from dataclasses import dataclass
+from typing import Callable
+
+import discord
+
+#each slash command maps to a plan job: which plan to run, how to turn its
+#final output into followup messages and what to say if it fails.
+#this module must not import portia_client at import time, so the gateway
+#can render/enqueue jobs without building a Portia client.
+
+
+@dataclass(frozen=True)
+class PlanJob:
+    plan: str
+    render: Callable[[object, dict], list[dict]]
+    error_message: str
+    error_ephemeral: bool = False
+    #plans that file issues or send emails must not be re-run after a worker dies mid-plan
+    side_effects: bool = False
+
+
+def render_bug_report(output, context: dict) -> list[dict]:
+    embed = discord.Embed(
+        title="✅ Bug Report Processed Successfully",
+        description="Your report has been submitted and tickets have been created.",
+        color=discord.Color.green()
+    )
+    embed.add_field(name="GitHub Issue", value=f"[View Issue]({output.github_issue_url})", inline=True)
+    embed.add_field(name="Linear Ticket", value=f"[View Ticket]({output.linear_ticket_url})", inline=True)
+    embed.set_footer(text=f"A confirmation has been sent to {context['email']}.")
+    return [{"embed": embed}]
+
+
+def render_feature_request(output, context: dict) -> list[dict]:
+    embed = discord.Embed(
+        title="💡 Feature Request Processed",
+        description="Your suggestion has been submitted and tickets have been created.",
+        color=discord.Color.blue()
+    )
+    embed.add_field(name="GitHub Issue", value=f"[View Issue]({output.github_issue_url})", inline=True)
+    embed.add_field(name="Linear Ticket", value=f"[View Ticket]({output.linear_ticket_url})", inline=True)
+    embed.set_footer(text=f"A confirmation has been sent to {context['email']}.")
+    return [{"embed": embed}]
+
+
+def render_doc_search(output, context: dict) -> list[dict]:
+    answer = output.answer
+    embed = discord.Embed(
+        title=f"🔎 Search Results for:",
+        description=f"> {context['query']}",
+        color=discord.Color.og_blurple()
+    )
+    embed.set_footer(text=f"Search performed for {context['display_name']}")
+    messages = [{"embed": embed}]
+    if answer:
+        for i in range(0, len(answer), 2000):
+            messages.append({"content": answer[i:i+2000]})
+    else:
+        messages.append({"content": "No answer was found."})
+    return messages
+
+
+def render_triage(output, context: dict) -> list[dict]:
+    result_markdown = output.triage_report
+    embed = discord.Embed(
+        title="📋 Triage Suggestions",
+        description=result_markdown if result_markdown else "No issues found requiring triage. Everything looks up to date!",
+        color=discord.Color.orange()
+    )
+    embed.set_footer(text="These are AI-generated suggestions for issues missing priorities or labels.")
+    return [{"embed": embed}]
+
+
+def render_priority(output, context: dict) -> list[dict]:
+    embed = discord.Embed(
+        title="📈 Top Priority Issues",
+        description=output.priority_list,
+        color=discord.Color.gold()
+    )
+    embed.set_footer(text="Analysis complete. These issues are recommended for immediate focus.")
+    return [{"embed": embed}]
+
+
+def render_digest(output, context: dict) -> list[dict]:
+    embed = discord.Embed(
+        title="🗓️ Weekly Activity Digest",
+        description=output.digest_report,
+        color=discord.Color.teal()
+    )
+    embed.set_footer(text="A summary of all activity in the last 7 days.")
+    return [{"embed": embed}]
+
+
+PLAN_JOBS = {
+    "bug_report": PlanJob(
+        plan="bug_report_plan",
+        render=render_bug_report,
+        error_message="❌ An error occurred while processing your bug report.",
+        error_ephemeral=True,
+        side_effects=True,
+    ),
+    "feature_request": PlanJob(
+        plan="feature_request_plan",
+        render=render_feature_request,
+        error_message="❌ An error occurred while processing your feature request.",
+        error_ephemeral=True,
+        side_effects=True,
+    ),
+    "doc_search": PlanJob(
+        plan="doc_search_plan",
+        render=render_doc_search,
+        error_message="Sorry, I couldn't find an answer to that question.",
+    ),
+    "triage": PlanJob(
+        plan="triage_plan",
+        render=render_triage,
+        error_message="Sorry, I was unable to analyze issues for triage.",
+    ),
+    "priority": PlanJob(
+        plan="prioritization_plan",
+        render=render_priority,
+        error_message="Sorry, I was unable to analyze the issues.",
+    ),
+    "digest": PlanJob(
+        plan="weekly_digest_plan",
+        render=render_digest,
+        error_message="Sorry, I was unable to generate the weekly digest.",
+    ),
+}
+
+
+def run_plan_job(kind: str, inputs: dict | None, context: dict) -> list[dict]:
+    """Run the plan behind `kind` (blocking) and return the followup messages to send."""
+    import portia_client
+
+    job = PLAN_JOBS[kind]
+    plan = getattr(portia_client, job.plan)
+    if inputs:
+        plan_run = portia_client.portia.run_plan(plan, plan_run_inputs=inputs)
+    else:
+        plan_run = portia_client.portia.run_plan(plan)
+    return job.render(plan_run.outputs.final_output.value, context)
+
+
+def error_messages(kind: str) -> list[dict]:
+    job = PLAN_JOBS[kind]
+    return [{"content": job.error_message, "ephemeral": job.error_ephemeral}]
+
+
+def log_plan_error(kind: str, error: Exception):
+    logging.error(f"Error running {PLAN_JOBS[kind].plan}: {error}")
@@ -0,0 +1,84 @@
+import sqlite3
+import warnings
+
+import pytest
+
+from job_queue import JobQueue
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return JobQueue(str(tmp_path / "plan_jobs.db"))
+
+
+def count_rows(queue):
+    conn = sqlite3.connect(queue.path)
+    try:
+        return conn.execute("SELECT COUNT(*) FROM plan_jobs").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_empty_path_is_rejected():
+    with pytest.raises(ValueError):
+        JobQueue("")
+
+
+def test_claim_returns_oldest_job_once(queue):
+    first = queue.enqueue("triage", {"token": "a"})
+    second = queue.enqueue("digest", {"token": "b"})
+
+    job_id, kind, payload, _, attempts = queue.claim("w1")
+    assert (job_id, kind, payload, attempts) == (first, "triage", {"token": "a"}, 1)
+    assert queue.claim("w2")[0] == second
+    assert queue.claim("w3") is None
+
+
+def test_claim_from_separate_queues_never_hands_out_a_job_twice(queue):
+    for i in range(20):
+        queue.enqueue("triage", {"n": i})
+    other = JobQueue(queue.path)
+
+    claimed = []
+    while True:
+        job = queue.claim("w1") or other.claim("w2")
+        if job is None:
+            break
+        claimed.append(job[0])
+    assert sorted(claimed) == sorted(set(claimed))
+    assert len(claimed) == 20
+
+
+def test_requeue_running_only_touches_the_given_worker(queue):
+    queue.enqueue("triage", {})
+    queue.enqueue("digest", {})
+    queue.claim("w1")
+    queue.claim("w2")
+
+    assert queue.requeue_running("w1") == 1
+    job_id, kind, _, _, attempts = queue.claim("w3")
+    assert kind == "triage"
+    assert attempts == 2
+    assert queue.claim("w3") is None
+
+    assert queue.requeue_running() == 2
+    assert queue.claim("w4") is not None
+
+
+def test_complete_and_fail_remove_the_job(queue):
+    done = queue.enqueue("triage", {"token": "a"})
+    failed = queue.enqueue("bug_report", {"token": "b", "inputs": {"user_email": "a@b.co"}})
+    queue.claim("w1")
+    queue.claim("w1")
+
+    queue.complete(done)
+    queue.fail(failed, "boom")
+    assert count_rows(queue) == 0
+
+
+def test_connections_are_closed(queue):
+    with warnings.catch_warnings():
+        warnings.simplefilter("error", ResourceWarning)
+        job_id = queue.enqueue("triage", {})
+        queue.claim("w1")
+        queue.complete(job_id)
@@ -0,0 +1,252 @@
+import sqlite3
+import threading
+import time
+
+import discord
+import pytest
+import requests
+
+import worker
+from job_queue import JobQueue
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return JobQueue(str(tmp_path / "plan_jobs.db"))
+
+
+@pytest.fixture
+def posted(monkeypatch):
+    sent = []
+    monkeypatch.setattr(worker, "post_followup", lambda application_id, token, message: sent.append((application_id, token, message)))
+    return sent
+
+
+def stub_plan(monkeypatch, result=None, error=None):
+    calls = []
+
+    def run_plan_job(kind, inputs, context):
+        calls.append((kind, inputs, context))
+        if error:
+            raise error
+        return result
+
+    monkeypatch.setattr(worker, "run_plan_job", run_plan_job)
+    return calls
+
+
+def claim(queue, kind, payload=None):
+    queue.enqueue(kind, payload or {"application_id": 1, "token": "tok"})
+    return queue.claim("w1")
+
+
+def test_to_webhook_payload():
+    embed = discord.Embed(title="Done")
+    assert worker.to_webhook_payload({"embed": embed}) == {"embeds": [embed.to_dict()]}
+    assert worker.to_webhook_payload({"content": "nope", "ephemeral": True}) == {"content": "nope", "flags": 64}
+    assert worker.to_webhook_payload({"content": "ok", "ephemeral": False}) == {"content": "ok"}
+
+
+def test_process_job_posts_plan_output(queue, posted, monkeypatch):
+    calls = stub_plan(monkeypatch, result=[{"content": "answer"}])
+    payload = {"application_id": 1, "token": "tok", "inputs": {"user_query": "q"}, "context": {"query": "q"}}
+
+    worker.process_job(queue, *claim(queue, "doc_search", payload))
+
+    assert calls == [("doc_search", {"user_query": "q"}, {"query": "q"})]
+    assert posted == [(1, "tok", {"content": "answer"})]
+    assert queue.claim("w2") is None
+
+
+def test_process_job_posts_error_message_when_plan_fails(queue, posted, monkeypatch):
+    stub_plan(monkeypatch, error=RuntimeError("boom"))
+
+    worker.process_job(queue, *claim(queue, "bug_report"))
+
+    assert posted == [(1, "tok", {"content": "❌ An error occurred while processing your bug report.", "ephemeral": True})]
+
+
+def test_process_job_drops_expired_interactions(queue, posted, monkeypatch):
+    calls = stub_plan(monkeypatch, result=[{"content": "late"}])
+    job_id, kind, payload, _, attempts = claim(queue, "triage")
+
+    worker.process_job(queue, job_id, kind, payload, time.time() - worker.INTERACTION_TTL - 1, attempts)
+
+    assert calls == []
+    assert posted == []
+    assert queue.claim("w2") is None
+
+
+def test_side_effecting_plan_is_not_rerun_after_worker_death(queue, posted, monkeypatch):
+    calls = stub_plan(monkeypatch, result=[{"content": "filed again"}])
+    claim(queue, "feature_request")
+    queue.requeue_running("w1")
+
+    worker.process_job(queue, *queue.claim("w2"))
+
+    assert calls == []
+    assert posted == [(1, "tok", {"content": "❌ An error occurred while processing your feature request.", "ephemeral": True})]
+    assert queue.claim("w3") is None
+
+
+def test_read_only_plan_gets_one_retry(queue, posted, monkeypatch):
+    calls = stub_plan(monkeypatch, result=[{"content": "ok"}])
+    claim(queue, "triage")
+    queue.requeue_running("w1")
+    worker.process_job(queue, *queue.claim("w2"))
+    assert len(calls) == 1
+
+    claim(queue, "digest")
+    queue.requeue_running("w1")
+    queue.claim("w2")
+    queue.requeue_running("w2")
+    worker.process_job(queue, *queue.claim("w3"))
+    assert len(calls) == 1
+    assert posted[-1][2]["content"] == "Sorry, I was unable to generate the weekly digest."
+
+
+def test_unknown_kind_is_failed_without_crashing(queue, posted, monkeypatch):
+    calls = stub_plan(monkeypatch, result=[{"content": "?"}])
+
+    worker.process_job(queue, *claim(queue, "summarize"))
+
+    assert calls == []
+    assert posted == []
+    assert queue.claim("w2") is None
+
+
+def test_payload_without_token_is_failed(queue, posted, monkeypatch):
+    calls = stub_plan(monkeypatch, result=[{"content": "?"}])
+
+    worker.process_job(queue, *claim(queue, "triage", {"application_id": 1}))
+
+    assert calls == []
+    assert queue.claim("w2") is None
+
+
+def test_job_too_close_to_expiry_gets_error_message(queue, posted, monkeypatch):
+    calls = stub_plan(monkeypatch, result=[{"content": "late"}])
+    job_id, kind, payload, _, attempts = claim(queue, "triage")
+    created_at = time.time() - (worker.INTERACTION_TTL - worker.MIN_TOKEN_LIFE) - 1
+
+    worker.process_job(queue, job_id, kind, payload, created_at, attempts)
+
+    assert calls == []
+    assert posted == [(1, "tok", {"content": "Sorry, I was unable to analyze issues for triage.", "ephemeral": False})]
+    assert queue.claim("w2") is None
+
+
+def test_claim_loop_fails_a_crashing_job_and_keeps_going(queue, monkeypatch):
+    stop = threading.Event()
+    handled = []
+
+    def process_job(q, job_id, kind, *rest):
+        handled.append(kind)
+        if kind == "triage":
+            raise sqlite3.OperationalError("database is locked")
+        stop.set()
+
+    monkeypatch.setattr(worker, "process_job", process_job)
+    claim_payload = {"application_id": 1, "token": "tok"}
+    queue.enqueue("triage", claim_payload)
+    queue.enqueue("digest", claim_payload)
+
+    worker.claim_loop(queue, "w1", stop)
+
+    assert handled == ["triage", "digest"]
+    assert queue.claim("w2") is None
+
+
+class FakeResponse:
+    def __init__(self, status_code, body=None):
+        self.status_code = status_code
+        self.body = body or {}
+
+    def json(self):
+        return self.body
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(str(self.status_code))
+
+
+def test_post_followup_retries_after_rate_limit(monkeypatch):
+    responses = [FakeResponse(429, {"retry_after": 0.25}), FakeResponse(200)]
+    requests_made, sleeps = [], []
+    monkeypatch.setattr(worker.requests, "post", lambda url, json, timeout: requests_made.append((url, json)) or responses.pop(0))
+    monkeypatch.setattr(worker.time, "sleep", sleeps.append)
+
+    worker.post_followup(1, "tok", {"content": "hi"})
+
+    assert requests_made == [(f"{worker.DISCORD_API}/webhooks/1/tok", {"content": "hi"})] * 2
+    assert sleeps == [0.25]
+
+
+def test_post_followup_gives_up_when_rate_limited(monkeypatch):
+    monkeypatch.setattr(worker.requests, "post", lambda url, json, timeout: FakeResponse(429, {"retry_after": 0}))
+    monkeypatch.setattr(worker.time, "sleep", lambda seconds: None)
+
+    with pytest.raises(requests.HTTPError):
+        worker.post_followup(1, "tok", {"content": "hi"})
+
+
+class FakeProcess:
+    def __init__(self, pid, alive=True, stubborn=False):
+        self.pid = pid
+        self.exitcode = None if alive else 1
+        self.alive = alive
+        self.stubborn = stubborn
+        self.calls = []
+
+    def is_alive(self):
+        return self.alive
+
+    def terminate(self):
+        self.calls.append("terminate")
+        if not self.stubborn:
+            self.alive = False
+
+    def join(self, timeout=None):
+        self.calls.append("join")
+
+    def kill(self):
+        self.calls.append("kill")
+        self.alive = False
+
+
+def test_restart_dead_workers_requeues_only_the_dead_workers_jobs(queue):
+    queue.enqueue("triage", {})
+    queue.enqueue("digest", {})
+    queue.claim("100")
+    queue.claim("200")
+    workers = [FakeProcess(100, alive=False), FakeProcess(200)]
+    spawned = []
+
+    worker.restart_dead_workers(queue, workers, lambda: spawned.append(FakeProcess(300)) or spawned[-1])
+
+    assert [process.pid for process in workers] == [300, 200]
+    assert queue.claim("300")[1] == "triage"
+    assert queue.claim("300") is None
+
+
+def test_stop_workers_lets_workers_finish_and_kills_stragglers():
+    polite, stubborn = FakeProcess(1), FakeProcess(2, stubborn=True)
+
+    worker.stop_workers([polite, stubborn], timeout=0)
+
+    assert polite.calls == ["terminate", "join"]
+    assert stubborn.calls == ["terminate", "join", "kill", "join"]
+
+
+@pytest.mark.parametrize("value", ["0", "-2", "many"])
+def test_positive_int_env_rejects_bad_values(monkeypatch, value):
+    monkeypatch.setenv("PLAN_WORKERS", value)
+    with pytest.raises(SystemExit):
+        worker.positive_int_env("PLAN_WORKERS", 4)
+
+
+def test_positive_int_env_defaults(monkeypatch):
+    monkeypatch.setenv("PLAN_WORKERS", "")
+    assert worker.positive_int_env("PLAN_WORKERS", 4) == 4
+    monkeypatch.setenv("PLAN_WORKERS", "3")
+    assert worker.positive_int_env("PLAN_WORKERS", 4) == 3
@@ -0,0 +1,226 @@
+import fcntl
+import logging
+import multiprocessing
+import os
+import signal
+import sys
+import threading
+import time
+
+import requests
+from dotenv import load_dotenv
+
+from job_queue import JobQueue
+from plan_jobs import PLAN_JOBS, error_messages, log_plan_error, run_plan_job
+
+#plan worker pool for the split deployment: bot.py (with PLAN_QUEUE_DB set)
+#only enqueues jobs, these processes run the portia plans and answer the
+#deferred interaction through its webhook.
+
+load_dotenv()
+
+DISCORD_API = "https://discord.com/api/v10"
+#discord invalidates interaction tokens 15 minutes after the interaction
+INTERACTION_TTL = 15 * 60
+#a plan is only started if the token will live at least this long; jobs that
+#waited longer get the command's error message while it can still be posted
+MIN_TOKEN_LIFE = 10 * 60
+POLL_INTERVAL = 0.5
+EPHEMERAL_FLAG = 1 << 6
+#a job is claimed again only when its worker died mid-run; plans with side
+#effects get no retry, the rest get one
+MAX_ATTEMPTS = 2
+#plans mostly wait on LLM and API calls, so each worker process runs several
+DEFAULT_THREADS = 4
+#on SIGTERM workers finish their current plan; after this they are killed
+SHUTDOWN_TIMEOUT = 5 * 60
+
+
+def to_webhook_payload(message: dict) -> dict:
+    payload = {}
+    if "content" in message:
+        payload["content"] = message["content"]
+    if "embed" in message:
+        payload["embeds"] = [message["embed"].to_dict()]
+    if message.get("ephemeral"):
+        payload["flags"] = EPHEMERAL_FLAG
+    return payload
+
+
+def post_followup(application_id: int, token: str, message: dict):
+    url = f"{DISCORD_API}/webhooks/{application_id}/{token}"
+    payload = to_webhook_payload(message)
+    for _ in range(5):
+        response = requests.post(url, json=payload, timeout=10)
+        if response.status_code == 429:
+            time.sleep(response.json().get("retry_after", 1))
+            continue
+        response.raise_for_status()
+        return
+    response.raise_for_status()
+
+
+def process_job(queue: JobQueue, job_id: int, kind: str, payload: dict, created_at: float, attempts: int):
+    job = PLAN_JOBS.get(kind)
+    if job is None or not isinstance(payload, dict) or "application_id" not in payload or "token" not in payload:
+        queue.fail(job_id, f"{kind}: malformed plan job")
+        return
+
+    age = time.time() - created_at
+    if age > INTERACTION_TTL:
+        queue.fail(job_id, f"{kind}: interaction token expired")
+        return
+
+    application_id, token = payload["application_id"], payload["token"]
+    max_attempts = 1 if job.side_effects else MAX_ATTEMPTS
+    error = None
+    if age > INTERACTION_TTL - MIN_TOKEN_LIFE:
+        error = f"{kind}: waited {age:.0f}s in the queue, too late to run the plan"
+        messages = error_messages(kind)
+    elif attempts > max_attempts:
+        error = f"{kind}: worker died on {attempts - 1} earlier attempt(s), not re-running"
+        messages = error_messages(kind)
+    else:
+        try:
+            messages = run_plan_job(kind, payload.get("inputs"), payload.get("context", {}))
+        except Exception as e:
+            log_plan_error(kind, e)
+            messages = error_messages(kind)
+
+    try:
+        for message in messages:
+            post_followup(application_id, token, message)
+    except Exception as e:
+        queue.fail(job_id, f"{kind}: delivery failed: {e}")
+        return
+    if error:
+        queue.fail(job_id, error)
+    else:
+        queue.complete(job_id)
+
+
+def claim_loop(queue: JobQueue, worker_id: str, stop: threading.Event):
+    while not stop.is_set():
+        try:
+            job = queue.claim(worker_id)
+        except Exception:
+            logging.exception("Failed to claim a plan job")
+            stop.wait(POLL_INTERVAL)
+            continue
+        if job is None:
+            stop.wait(POLL_INTERVAL)
+            continue
+        try:
+            process_job(queue, *job)
+        except Exception as e:
+            logging.exception(f"Plan job {job[0]} ({job[1]}) crashed")
+            try:
+                queue.fail(job[0], f"{job[1]}: {e}")
+            except Exception:
+                logging.exception(f"Could not mark plan job {job[0]} as failed")
+
+
+def run_worker(db_path: str, threads: int):
+    #SIGTERM from the pool stops claiming and lets in-flight plans finish;
+    #SIGINT is left to the pool, which forwards it as SIGTERM
+    stop = threading.Event()
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+    #force: under fork the root handler configured by main() is inherited
+    logging.basicConfig(level=logging.INFO, format=f"%(asctime)s [worker {os.getpid()}] %(levelname)s %(message)s", force=True)
+    queue = JobQueue(db_path)
+    #jobs are owned per process, so a dead process requeues all of its threads' jobs
+    worker_id = str(os.getpid())
+    claimers = [threading.Thread(target=claim_loop, args=(queue, worker_id, stop)) for _ in range(threads)]
+    for thread in claimers:
+        thread.start()
+    for thread in claimers:
+        thread.join()
+
+
+def lock_pool(db_path: str):
+    """Take an exclusive lock so only one pool (and its children) ever owns the queue."""
+    lock_file = open(f"{db_path}.lock", "w")
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        sys.exit(f"Another plan worker pool is already running on {db_path}")
+    return lock_file
+
+
+def positive_int_env(name: str, default: int) -> int:
+    value = os.getenv(name)
+    if not value:
+        return default
+    try:
+        number = int(value)
+    except ValueError:
+        number = 0
+    if number < 1:
+        sys.exit(f"{name} must be a positive integer, got {value!r}")
+    return number
+
+
+def restart_dead_workers(queue: JobQueue, workers: list, spawn):
+    for i, process in enumerate(workers):
+        if not process.is_alive():
+            logging.warning(f"Plan worker {process.pid} exited ({process.exitcode}), restarting")
+            queue.requeue_running(str(process.pid))
+            workers[i] = spawn()
+
+
+def stop_workers(workers: list, timeout: float):
+    #terminate() sends SIGTERM, which workers treat as "finish the current plan"
+    for process in workers:
+        process.terminate()
+    deadline = time.monotonic() + timeout
+    for process in workers:
+        process.join(max(0, deadline - time.monotonic()))
+    for process in workers:
+        if process.is_alive():
+            logging.warning(f"Plan worker {process.pid} did not finish within {timeout}s, killing it")
+            process.kill()
+            process.join()
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    #bot.py treats an empty PLAN_QUEUE_DB as inline mode, so never guess a path here
+    db_path = os.getenv("PLAN_QUEUE_DB")
+    if not db_path:
+        sys.exit("PLAN_QUEUE_DB must be set to the queue database used by bot.py")
+    count = positive_int_env("PLAN_WORKERS", os.cpu_count() or 1)
+    threads = positive_int_env("PLAN_THREADS", DEFAULT_THREADS)
+
+    lock_file = lock_pool(db_path)
+    queue = JobQueue(db_path)
+    #we hold the pool lock, so anything marked running was orphaned by a previous pool
+    requeued = queue.requeue_running()
+    if requeued:
+        print(f"Requeued {requeued} orphaned plan job(s)")
+
+    def spawn():
+        process = multiprocessing.Process(target=run_worker, args=(db_path, threads), daemon=True)
+        process.start()
+        return process
+
+    #SIGTERM (systemd, docker) unwinds through the finally below like Ctrl-C does
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    workers = []
+    try:
+        workers.extend(spawn() for _ in range(count))
+        print(f"Started {count} plan worker(s) x {threads} thread(s) on {db_path}")
+        while True:
+            restart_dead_workers(queue, workers, spawn)
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+        stop_workers(workers, SHUTDOWN_TIMEOUT)
+        lock_file.close()
+
+
+if __name__ == "__main__":
+    main()